@@ -4,646 +4,1254 @@ Flask backend for AxiDraw and NextDraw plotter control.
 Iteration 2: Plotting + Plot UI with SVG plotting, layer support, and settings.
 """
 
+import io
+import os
+import time
+import zlib
+import hashlib
+import queue
 import threading
 import signal
-from flask import Flask, request, jsonify, send_from_directory
+import atexit
+import functools
+import multiprocessing
+from multiprocessing import shared_memory
+from multiprocessing.connection import wait as mp_wait
+import logging
+import logging.handlers
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field, replace
+import re
+import orjson
+from lxml import etree
+from flask import Flask, Response, request, abort
+from flask.json.provider import JSONProvider
+from werkzeug.exceptions import BadRequest, RequestEntityTooLarge
+from werkzeug.serving import WSGIRequestHandler
+import plot_runner
 from plotter_adapter import (
     create_plotter_instance,
     get_plotter_type,
     set_plotter_type,
     usb_command as adapter_usb_command,
+    build_command,
+    set_low_latency,
     get_plotter_display_name,
     get_api_display_name,
     PLOTTER_AXIDRAW,
     PLOTTER_NEXTDRAW,
-    is_nextdraw_available
+    PLOTTER_TYPES,
+    is_nextdraw_available,
+    refresh_plotter_availability
 )
 
+
+class GzipRequestMiddleware:
+    """WSGI middleware that inflates request bodies sent with Content-Encoding: gzip.
+    
+    The UI gzips large SVG uploads; the app below sees a plain body with a
+    matching CONTENT_LENGTH. Bodies that inflate past max_size are rejected (413),
+    corrupt or truncated gzip data with 400.
+    """
+    
+    def __init__(self, wsgi_app, max_size=256 * 1024 * 1024):
+        self.wsgi_app = wsgi_app
+        self.max_size = max_size
+    
+    def __call__(self, environ, start_response):
+        if environ.get('HTTP_CONTENT_ENCODING', '').strip().lower() == 'gzip':
+            stream = environ['wsgi.input']
+            length = environ.get('CONTENT_LENGTH')
+            compressed = stream.read(int(length)) if length else stream.read()
+            inflater = zlib.decompressobj(16 + zlib.MAX_WBITS)
+            try:
+                body = inflater.decompress(compressed, self.max_size)
+            except zlib.error:
+                return BadRequest("Invalid gzip request body")(environ, start_response)
+            if inflater.unconsumed_tail:
+                return RequestEntityTooLarge()(environ, start_response)
+            if not inflater.eof:
+                # Stream ended before the gzip trailer: the upload was cut off
+                return BadRequest("Truncated gzip request body")(environ, start_response)
+            environ['wsgi.input'] = io.BytesIO(body)
+            environ['CONTENT_LENGTH'] = str(len(body))
+            del environ['HTTP_CONTENT_ENCODING']
+        return self.wsgi_app(environ, start_response)
+
+
+class OrjsonProvider(JSONProvider):
+    """Flask JSON provider backed by orjson, so request.get_json(), jsonify and app.json use it too."""
+    
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode()
+    
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+
 app = Flask(__name__, static_folder='static')
+app.json = OrjsonProvider(app)
+app.wsgi_app = GzipRequestMiddleware(app.wsgi_app)
+
+# Diagnostics are handed to a queue and written by a listener thread, so a
+# slow terminal or journal pipe never stalls a request thread. The handler is
+# attached and the thread started by init_server().
+log_queue = queue.SimpleQueue()
+logger = logging.getLogger('hotplot')
+logger.setLevel(logging.INFO)
+logger.propagate = False
+log_listener = logging.handlers.QueueListener(log_queue, logging.StreamHandler())
 
-# Global plotter instance (for interactive mode)
-axidraw_instance = None
-# Global plot instance (for plotting operations)
-plot_instance = None
-# Plot thread (minimal - just to track if plot is running)
-plot_thread = None
-# Paused SVG (for resume functionality)
-paused_svg = None
-# Plot settings for resume (layer, speeds, pen heights)
-paused_plot_settings = None
-# Flag to track if plot is active (for signal handler)
-plot_active = False
+# Runs plot jobs (plot, resume, Return Home) one at a time on a single reused thread
+plot_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='hotplot-plot')
+# Set from claim_plot_slot() until the claimed job has finished
+plot_busy = threading.Event()
+
+
+class PausedSvg:
+    """
+    Paused plot SVG stored as UTF-8 in a shared memory block.
+    
+    Keeps the (often multi-MB) SVG out of the server's heap, and lets the plot
+    child process read it by name instead of receiving a pickled copy.
+    Whoever takes it out of STATE must call release() when done with it.
+    """
+    __slots__ = ('shm', 'size')
+    
+    def __init__(self, svg):
+        data = svg.encode('utf-8')
+        self.size = len(data)
+        # Zero-size blocks are not allowed
+        self.shm = shared_memory.SharedMemory(create=True, size=max(self.size, 1))
+        self.shm.buf[:self.size] = data
+    
+    @property
+    def ref(self):
+        """(name, size) for plot_runner to attach to the block."""
+        return (self.shm.name, self.size)
+    
+    def release(self):
+        """Free the shared memory block."""
+        self.shm.close()
+        try:
+            self.shm.unlink()
+        except FileNotFoundError:
+            pass
+
+
+@dataclass(frozen=True, slots=True)
+class PlotSettings:
+    """Layer, pen heights and speeds of a plot, kept with the paused plot for resume."""
+    layer: int = None
+    pen_pos_up: int = 70
+    pen_pos_down: int = 40
+    speed_penup: int = 75
+    speed_pendown: int = 25
+    
+    def options(self):
+        """Plot options for plot_runner (the layer only when one is set)."""
+        options = {
+            "pen_pos_up": self.pen_pos_up,
+            "pen_pos_down": self.pen_pos_down,
+            "speed_penup": self.speed_penup,
+            "speed_pendown": self.speed_pendown
+        }
+        if self.layer is not None:
+            options["layer"] = self.layer
+        return options
+
+
+@dataclass
+class PlotterState:
+    """Plotter and plot state shared by request threads, the plot worker and the Ctrl+C watcher."""
+    # Plotter instance for interactive mode
+    instance: object = None
+    # True when the UI should show "connected" but the interactive session is only
+    # reopened on the next command. Saves a USB connect/disconnect cycle when plots
+    # are started back to back.
+    reconnect_pending: bool = False
+    # Child process running the current plot job (see _run_in_child)
+    plot_process: object = None
+    # Paused SVG (for resume functionality), kept in shared memory (see PausedSvg)
+    paused_svg: 'PausedSvg' = None
+    # Plot settings for resume (layer, speeds, pen heights)
+    paused_settings: PlotSettings = None
+    # Set while a plot job runs in plot_process (checked by the Ctrl+C watcher).
+    # An Event, so it can be read without taking STATE_LOCK.
+    plot_active: threading.Event = field(default_factory=threading.Event)
+
+
+STATE = PlotterState()
+# Guards multi-field updates of STATE. Never held across USB I/O.
+STATE_LOCK = threading.RLock()
+# Serializes USB I/O on the interactive session: commands and batches run under
+# it, and _drop_interactive() takes it so a session is never closed mid-command
+hardware_lock = threading.Lock()
+# Set by the SIGINT handler, cleared by the signal watcher thread
+sigint_event = threading.Event()
+# Wakes up /events streams; state_version is bumped on every state change
+state_changed = threading.Condition()
+state_version = 0
+# Number of open /events streams (guarded by state_changed)
+sse_clients = 0
+# Last serialized state as (timestamp, state_version, body, etag); reused by /state and /events
+state_cache = (0.0, -1, b'', '')
+# How long a cached state body may be served. Changes bump state_version and bypass
+# the cache immediately; the TTL only bounds staleness for anything not notified.
+# With /events clients connected they get pushes, so polls can be served longer.
+STATE_CACHE_TTL = 0.1
+STATE_CACHE_TTL_SSE = 5.0
+# /plot rejects uploads whose first this-many characters contain no '<svg' tag
+SVG_SNIFF_BYTES = 4096
+# Disable XY motors on disconnect (EM,0,0 = Enable Motors, 0 = disable)
+CMD_MOTORS_OFF = build_command("EM", 0, 0)
+# Plot setting names as sent by the UI, mapped to PlotSettings fields. Settings
+# the UI leaves out keep the PlotSettings defaults.
+_SETTINGS_FIELDS = {
+    'pen_up': 'pen_pos_up',
+    'pen_down': 'pen_pos_down',
+    'speed_up': 'speed_penup',
+    'speed_down': 'speed_pendown',
+}
+# Plotter names and NextDraw availability as reported by get_state(). They only
+# change when the plotter type is switched, so they are kept here and recomputed
+# by refresh_plotter_info() instead of on every poll.
+_DISPLAY_NAME = None
+_API_NAME = None
+_NEXTDRAW_AVAIL = None
+
+
+def refresh_plotter_info():
+    """Recompute the cached plotter names and NextDraw availability. Returns True if any changed."""
+    global _DISPLAY_NAME, _API_NAME, _NEXTDRAW_AVAIL
+    info = (get_plotter_display_name(), get_api_display_name(), is_nextdraw_available())
+    changed = info != (_DISPLAY_NAME, _API_NAME, _NEXTDRAW_AVAIL)
+    _DISPLAY_NAME, _API_NAME, _NEXTDRAW_AVAIL = info
+    return changed
 
 
 def get_state():
     """Get current connection state and plot state."""
+    with STATE_LOCK:
+        connected = STATE.instance is not None or STATE.reconnect_pending
+        paused = STATE.paused_svg is not None
     state = {
-        "connected": axidraw_instance is not None,
-        "plotting": plot_thread is not None and plot_thread.is_alive(),
-        "paused": paused_svg is not None,
-        "plot_active": plot_active,
+        "connected": connected,
+        "plotting": plot_is_busy(),
+        "paused": paused,
+        "plot_active": STATE.plot_active.is_set(),
         "plotter_type": get_plotter_type(),
-        "plotter_display_name": get_plotter_display_name(),
-        "api_display_name": get_api_display_name(),
-        "nextdraw_available": is_nextdraw_available()
+        "plotter_display_name": _DISPLAY_NAME,
+        "api_display_name": _API_NAME,
+        "nextdraw_available": _NEXTDRAW_AVAIL
     }
     return state
 
 
+def get_state_json():
+    """Serialized get_state() and its ETag, cached until the state changes or the TTL runs out."""
+    global state_cache
+    now = time.monotonic()
+    ttl = STATE_CACHE_TTL_SSE if sse_clients else STATE_CACHE_TTL
+    version = state_version
+    cached_at, cached_version, body, etag = state_cache
+    if cached_version == version and now - cached_at < ttl:
+        return body, etag
+    body = orjson.dumps(get_state())
+    etag = _etag(body)
+    state_cache = (now, version, body, etag)
+    return body, etag
+
+
+def notify_state_changed():
+    """Invalidate the cached state and push it to /events streams."""
+    global state_version
+    with state_changed:
+        state_version += 1
+        state_changed.notify_all()
+
+
+def event_stream():
+    """Yield the state as Server-Sent Events: once on connect, then on every change."""
+    global sse_clients
+    with state_changed:
+        sse_clients += 1
+    try:
+        version = -1
+        last_etag = None
+        while True:
+            with state_changed:
+                state_changed.wait_for(lambda: state_version != version, timeout=15)
+                changed = state_version != version
+                version = state_version
+            if changed:
+                # Several notifications can end in the same state; send it only once
+                body, etag = get_state_json()
+                if etag != last_etag:
+                    last_etag = etag
+                    yield b"data: " + body + b"\n\n"
+            else:
+                # Comment line keeps the connection alive and detects closed tabs
+                yield b": keep-alive\n\n"
+    finally:
+        with state_changed:
+            sse_clients -= 1
+
+
+def _plot_job_done(future):
+    """Release the plot slot once a job finishes (runs on the plot thread)."""
+    if not future.cancelled() and future.exception() is not None:
+        logger.error("Error in plot worker", exc_info=future.exception())
+    release_plot_slot()
+
+
+def plot_is_busy():
+    """True while a plot job is claimed, queued or running."""
+    return plot_busy.is_set()
+
+
+def claim_plot_slot():
+    """Reserve the plot worker for a new job. Returns False if a plot is already in progress."""
+    with STATE_LOCK:
+        if plot_is_busy():
+            return False
+        plot_busy.set()
+        return True
+
+
+def release_plot_slot():
+    """Give up the plot slot (job finished, or never started) and tell /events clients."""
+    plot_busy.clear()
+    notify_state_changed()
+
+
+def start_plot_job(fn, *args):
+    """Hand a plot job to the plot thread. Caller must hold the slot from claim_plot_slot()."""
+    plot_executor.submit(fn, *args).add_done_callback(_plot_job_done)
+    notify_state_changed()
+
+
+def ensure_interactive():
+    """Open the deferred interactive session if one is pending. Returns the session's instance, or None."""
+    with STATE_LOCK:
+        reopen = STATE.instance is None and STATE.reconnect_pending
+        if reopen:
+            STATE.reconnect_pending = False
+    if reopen:
+        reconnect_interactive()
+        notify_state_changed()
+    with STATE_LOCK:
+        return STATE.instance
+
+
 def reconnect_interactive():
     """Re-establish interactive connection (e.g. after a plot finishes). Leaves UI connection switch on."""
-    global axidraw_instance
-    if axidraw_instance is not None:
+    with STATE_LOCK:
+        if STATE.instance is not None:
+            return
+    try:
+        instance = create_plotter_instance()
+        instance.interactive()
+        if not instance.connect():
+            return
+        set_low_latency(instance)
+        
+        # Publish the session unless another request connected while we were on USB
+        with STATE_LOCK:
+            raced = STATE.instance is not None
+            if not raced:
+                STATE.instance = instance
+        if raced:
+            instance.disconnect()
+            return
+        plotter_name = get_plotter_display_name()
+        logger.info("Reconnected interactive session after plot (%s)", plotter_name)
+    except Exception as e:
+        logger.warning("Could not reconnect interactive session: %s", e)
+
+
+def _drop_interactive(graceful=True):
+    """Close the interactive session (or a pending reopen). Returns True if there was an open session.
+    
+    graceful=True first disables the motors (EM,0,0) so the carriage can be moved by hand.
+    Plot and resume pass graceful=False: they take over the port immediately and the
+    motors are re-enabled by the next move, so that USB round-trip is skipped.
+    
+    Waits for a running /cmd or /cmd_batch to finish first (hardware_lock), so the
+    session is never closed, and the port never handed to a plot, mid-command.
+    """
+    with hardware_lock:
+        with STATE_LOCK:
+            instance = STATE.instance
+            STATE.instance = None
+            STATE.reconnect_pending = False
+        if instance is None:
+            return False
+        
+        if graceful:
+            try:
+                adapter_usb_command(instance, CMD_MOTORS_OFF)
+            except Exception as motor_error:
+                # If motor disable fails, log but continue with disconnect
+                logger.warning("Could not disable motors: %s", motor_error)
+        _force_disconnect(instance, "interactive session")
+        return True
+
+
+def _force_disconnect(instance, what):
+    """Disconnect a plotter instance (if any), logging instead of raising on failure."""
+    if instance is None:
         return
     try:
-        axidraw_instance = create_plotter_instance()
-        axidraw_instance.interactive()
-        if axidraw_instance.connect():
-            plotter_name = get_plotter_display_name()
-            print(f"Reconnected interactive session after plot ({plotter_name})")
-        else:
-            axidraw_instance = None
+        instance.disconnect()
     except Exception as e:
-        print(f"Warning: Could not reconnect interactive session: {e}")
-        axidraw_instance = None
+        logger.warning("Error disconnecting %s: %s", what, e)
+
+
+def _exclusive_plotter(job):
+    """Give a plot job (plot, resume, Return Home) the plotter to itself.
+    
+    Before the job the interactive session is closed (no motor-off: the job takes
+    over the port at once). After it the plot process is cleared. The UI stays
+    connected, with the session reopened on the next command, only if a session
+    was open before the job and the job reached the plotter (it returned an error
+    code); otherwise the UI is left disconnected.
+    """
+    @functools.wraps(job)
+    def run(*args):
+        had_session = _drop_interactive(graceful=False)
+        reached_plotter = False
+        try:
+            reached_plotter = job(*args) is not None
+        finally:
+            with STATE_LOCK:
+                STATE.plot_process = None
+                STATE.plot_active.clear()
+                if had_session and reached_plotter:
+                    STATE.reconnect_pending = True
+    return run
+
+
+def _json(payload, status=200):
+    """JSON response encoded with orjson (faster than jsonify, no key sorting)."""
+    return Response(orjson.dumps(payload), status=status, mimetype='application/json')
+
+
+def _canned_error(message, status=400):
+    """Factory for a fixed error response. The body is encoded once; each call only builds the Response."""
+    body = orjson.dumps({"success": False, "error": message})
+    return lambda: Response(body, status=status, mimetype='application/json')
+
+
+# Error responses that never vary
+ERR_ALREADY_CONNECTED = _canned_error("Already connected")
+ERR_NOT_CONNECTED = _canned_error("Not connected")
+ERR_CONNECT_FIRST = _canned_error("Not connected. Connect first.")
+ERR_BUSY = _canned_error("busy", 429)
+ERR_SVG_REQUIRED = _canned_error("SVG content is required")
+ERR_SVG_INVALID = _canned_error("SVG content must contain an <svg> element")
+ERR_PLOT_IN_PROGRESS = _canned_error("Plot operation already in progress")
+ERR_NO_PAUSED_PLOT = _canned_error("No paused plot to resume")
+ERR_HOME_NOT_PAUSED = _canned_error("Return Home is only available when a plot is paused")
+ERR_BAD_JSON = _canned_error("Request body must be a JSON object")
+ERR_BAD_COMMAND = _canned_error("command must be a string")
+ERR_BAD_COMMANDS = _canned_error("commands must be a list of strings")
+
+
+def _etag(body):
+    """Short content hash used as an HTTP ETag."""
+    return hashlib.blake2b(body, digest_size=8).hexdigest()
 
 
+def _conditional_response(body, etag, mimetype='application/json', cache_control='no-cache'):
+    """Response that becomes an empty 304 when the client already has this body."""
+    headers = {'ETag': f'"{etag}"', 'Cache-Control': cache_control}
+    if etag in request.if_none_match:
+        return Response(status=304, headers=headers)
+    return Response(body, mimetype=mimetype, headers=headers)
+
+
+def _read_index():
+    """Read index.html into memory as (mtime, body, etag)."""
+    with open(INDEX_PATH, 'rb') as f:
+        body = f.read()
+    return os.path.getmtime(INDEX_PATH), body, _etag(body)
+
+
+def _request_json(body=None):
+    """Parse the JSON request body (or body, e.g. a form field) with orjson.
+    
+    Answers 400 (not a 500 from the decode error) if it isn't a JSON object.
+    """
+    try:
+        data = orjson.loads(request.get_data(cache=False) if body is None else body)
+    except orjson.JSONDecodeError:
+        data = None
+    if not isinstance(data, dict):
+        abort(ERR_BAD_JSON())
+    return data
 
 
 @app.route('/')
 def index():
-    """Serve the main UI page."""
-    return send_from_directory(app.static_folder, 'index.html')
+    """Serve the main UI page from memory."""
+    global index_cache
+    # In debug mode pick up edits to index.html without a restart
+    if index_cache is None or (app.debug and os.path.getmtime(INDEX_PATH) != index_cache[0]):
+        index_cache = _read_index()
+    _, body, etag = index_cache
+    cache_control = 'no-cache' if app.debug else 'public, max-age=60'
+    return _conditional_response(body, etag, 'text/html', cache_control)
 
 
 @app.route('/state', methods=['GET'])
 def state():
     """Get the current connection state."""
-    return jsonify(get_state())
+    return _conditional_response(*get_state_json())
+
+
+@app.route('/events', methods=['GET'])
+def events():
+    """Stream state changes to the UI (Server-Sent Events)."""
+    response = Response(event_stream(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    # Tell nginx (and compatible proxies) not to buffer the stream
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
 
 
 @app.route('/config', methods=['GET'])
 def get_config():
     """Get current plotter configuration."""
-    return jsonify({
+    # Re-check availability here so a newly installed NextDraw library shows up
+    # without a server restart; /state and plotting use the cached value
+    refresh_plotter_availability()
+    if refresh_plotter_info():
+        notify_state_changed()
+    body = orjson.dumps({
         "plotter_type": get_plotter_type(),
-        "plotter_display_name": get_plotter_display_name(),
-        "api_display_name": get_api_display_name(),
-        "nextdraw_available": is_nextdraw_available()
+        "plotter_display_name": _DISPLAY_NAME,
+        "api_display_name": _API_NAME,
+        "nextdraw_available": _NEXTDRAW_AVAIL
     })
+    return _conditional_response(body, _etag(body))
 
 
 @app.route('/config', methods=['POST'])
 def set_config():
     """Set plotter configuration."""
-    global axidraw_instance
-    
-    data = request.get_json()
+    data = _request_json()
     plotter_type = data.get('plotter_type')
     
-    if plotter_type not in (PLOTTER_AXIDRAW, PLOTTER_NEXTDRAW):
-        return jsonify({"success": False, "error": f"Invalid plotter_type. Must be '{PLOTTER_AXIDRAW}' or '{PLOTTER_NEXTDRAW}'"}), 400
+    # isinstance first: JSON lists/objects are unhashable and can't be looked up
+    if not isinstance(plotter_type, str) or plotter_type not in PLOTTER_TYPES:
+        return _json({"success": False, "error": f"Invalid plotter_type. Must be '{PLOTTER_AXIDRAW}' or '{PLOTTER_NEXTDRAW}'"}, 400)
     
     if plotter_type == PLOTTER_NEXTDRAW and not is_nextdraw_available():
-        return jsonify({
+        return _json({
             "success": False,
             "error": "NextDraw library is not installed. Please install it to use NextDraw support."
-        }), 400
+        }, 400)
     
     # If currently connected, disconnect first
-    if axidraw_instance is not None:
-        try:
-            adapter_usb_command(axidraw_instance, "EM,0,0")
-            axidraw_instance.disconnect()
-        except Exception as e:
-            print(f"Warning: Error disconnecting during plotter type switch: {e}")
-        axidraw_instance = None
+    _drop_interactive()
     
     # Set the new plotter type
     set_plotter_type(plotter_type)
+    refresh_plotter_info()
+    notify_state_changed()
     
-    return jsonify({
+    return _json({
         "success": True,
-        "message": f"Plotter type set to {get_plotter_display_name()}",
+        "message": f"Plotter type set to {_DISPLAY_NAME}",
         "plotter_type": get_plotter_type(),
-        "plotter_display_name": get_plotter_display_name(),
-        "api_display_name": get_api_display_name()
+        "plotter_display_name": _DISPLAY_NAME,
+        "api_display_name": _API_NAME
     })
 
 
-@app.route('/connect', methods=['POST'])
 def connect():
     """Connect to the plotter."""
-    global axidraw_instance
-    
-    if axidraw_instance is not None:
-        return jsonify({"success": False, "error": "Already connected"}), 400
+    with STATE_LOCK:
+        if STATE.instance is not None:
+            return ERR_ALREADY_CONNECTED()
+        STATE.reconnect_pending = False
     
     try:
         plotter_name = get_plotter_display_name()
-        axidraw_instance = create_plotter_instance()
-        axidraw_instance.interactive()
-        connect_result = axidraw_instance.connect()
+        instance = create_plotter_instance()
+        instance.interactive()
+        connect_result = instance.connect()
         
         # Check if connect() returned False (device not found)
         if connect_result is False:
-            axidraw_instance = None
-            return jsonify({"success": False, "error": f"Failed to connect: No {plotter_name} device found"}), 500
+            return _json({"success": False, "error": f"Failed to connect: No {plotter_name} device found"}, 500)
         
-        return jsonify({"success": True, "message": f"Connected to {plotter_name}"})
+        # Interactive commands are one short USB round-trip each; skip the driver's latency timer
+        set_low_latency(instance)
+        
+        # Publish the session unless another request connected while we were on USB
+        with STATE_LOCK:
+            raced = STATE.instance is not None
+            if not raced:
+                STATE.instance = instance
+        if raced:
+            instance.disconnect()
+            return ERR_ALREADY_CONNECTED()
+        notify_state_changed()
+        return _json({"success": True, "message": f"Connected to {plotter_name}"})
     except ImportError as e:
         # NextDraw library not available
-        print(f"Error connecting: {e}")
-        axidraw_instance = None
-        return jsonify({"success": False, "error": str(e)}), 500
+        logger.error("Error connecting: %s", e)
+        return _json({"success": False, "error": str(e)}, 500)
     except Exception as e:
         plotter_name = get_plotter_display_name()
-        print(f"Error connecting to {plotter_name}: {e}")
-        axidraw_instance = None
-        return jsonify({"success": False, "error": str(e)}), 500
+        logger.exception("Error connecting to %s", plotter_name)
+        return _json({"success": False, "error": str(e)}, 500)
 
 
-@app.route('/disconnect', methods=['POST'])
 def disconnect():
     """Disconnect from the plotter."""
-    global axidraw_instance
+    with STATE_LOCK:
+        connected = STATE.instance is not None or STATE.reconnect_pending
+    if not connected:
+        return ERR_NOT_CONNECTED()
+    
+    # Disable motors and close the session (a pending reopen is just cleared)
+    plotter_name = get_plotter_display_name()
+    _drop_interactive()
+    notify_state_changed()
+    return _json({"success": True, "message": f"Disconnected from {plotter_name}"})
+
+
+def _motion(method, message):
+    """Build a handler for a two-argument motion command (moveto, lineto, goto, ...)."""
+    def handler(ad, x, y):
+        getattr(ad, method)(x, y)
+        return message.format(x, y)
+    return handler
+
+
+def _penup(ad):
+    ad.penup()
+    return "pen up"
+
+
+def _pendown(ad):
+    ad.pendown()
+    return "pen down"
+
+
+def _home(ad):
+    ad.goto(0, 0)
+    return "moved to home (0, 0)"
+
+
+def _delay(ad, time_ms):
+    ad.delay(time_ms)
+    return f"delayed {time_ms} ms"
+
+
+def _draw_path(ad, values):
+    # Pair up the coordinates in a single pass: zip() pulls x then y from the same iterator.
+    # pyaxidraw expects a list of 2-element lists (mutable), not tuples
+    coords = map(float, values)
+    vertex_list = [[x, y] for x, y in zip(coords, coords)]
+    ad.draw_path(vertex_list)
+    return f"drew path with {len(vertex_list)} points"
+
+
+def _turtle_pos(ad):
+    pos = ad.turtle_pos()
+    return f"turtle_pos: ({pos[0]:.4f}, {pos[1]:.4f})"
+
+
+def _current_pos(ad):
+    pos = ad.current_pos()
+    return f"current_pos: ({pos[0]:.4f}, {pos[1]:.4f})"
+
+
+# Interactive commands: name -> (argument converters, handler returning the reply message).
+# draw_path takes a variable number of coordinates and is validated in dispatch_one.
+CMD_TABLE = {
+    'moveto': ((float, float), _motion('moveto', "moved to ({}, {})")),
+    'lineto': ((float, float), _motion('lineto', "drew line to ({}, {})")),
+    'goto': ((float, float), _motion('goto', "moved to ({}, {})")),
+    'move': ((float, float), _motion('move', "moved by ({}, {})")),
+    'line': ((float, float), _motion('line', "drew line by ({}, {})")),
+    'go': ((float, float), _motion('go', "moved by ({}, {})")),
+    'penup': ((), _penup),
+    'pendown': ((), _pendown),
+    'home': ((), _home),
+    'delay': ((int,), _delay),
+    'draw_path': (None, _draw_path),
+    'turtle_pos': ((), _turtle_pos),
+    'current_pos': ((), _current_pos),
+}
+
+
+def parse_command(command):
+    """Split a stripped command line into (lowercased name, argument strings)."""
+    # split(None, 1) separates the name (at any whitespace) without splitting the
+    # whole line; only the arguments are split, and only when there are any
+    parts = command.split(None, 1)
+    if not parts:
+        return '', ()
+    return parts[0].lower(), parts[1].split() if len(parts) > 1 else ()
+
+
+def dispatch_one(instance, cmd_name, args):
+    """Execute one interactive command on instance. Returns (ok, message); ok is False for bad input."""
+    entry = CMD_TABLE.get(cmd_name)
+    if entry is None:
+        return False, f"Unknown command: {cmd_name}"
+    converters, handler = entry
     
-    if axidraw_instance is None:
-        return jsonify({"success": False, "error": "Not connected"}), 400
+    if converters is None:
+        if len(args) < 4 or len(args) % 2 != 0:
+            return False, "draw_path requires at least 4 numbers (x1 y1 x2 y2 ...)"
+        return True, handler(instance, args)
     
-    try:
-        plotter_name = get_plotter_display_name()
-        # Disable motors before disconnecting to free them up
-        try:
-            # Send command to disable XY motors (EM,0,0 = Enable Motors, 0 = disable)
-            adapter_usb_command(axidraw_instance, "EM,0,0")
-        except Exception as motor_error:
-            # If motor disable fails, log but continue with disconnect
-            print(f"Warning: Could not disable motors: {motor_error}")
-        
-        axidraw_instance.disconnect()
-        axidraw_instance = None
-        return jsonify({"success": True, "message": f"Disconnected from {plotter_name}"})
-    except Exception as e:
-        plotter_name = get_plotter_display_name()
-        print(f"Error disconnecting from {plotter_name}: {e}")
-        # Ensure instance is cleared even on error
-        axidraw_instance = None
-        return jsonify({"success": False, "error": str(e)}), 500
+    if len(args) < len(converters):
+        return False, f"{cmd_name} requires {len(converters)} argument(s)"
+    if converters:
+        args = [convert(value) for convert, value in zip(converters, args)]
+        return True, handler(instance, *args)
+    return True, handler(instance)
 
 
 @app.route('/cmd', methods=['POST'])
 def cmd():
     """Execute a command on the AxiDraw plotter."""
-    global axidraw_instance
-    
-    data = request.get_json()
-    command = data['command'].strip()
-    
-    if axidraw_instance is None:
-        return jsonify({"success": False, "error": "Not connected. Connect first."}), 400
+    data = _request_json()
+    command = data.get('command')
+    if not isinstance(command, str):
+        return ERR_BAD_COMMAND()
+    command = command.strip()
     
+    # Don't park the request thread behind another command; the UI retries on 429
+    if not hardware_lock.acquire(blocking=False):
+        return ERR_BUSY()
     try:
-        parts = command.split()
-        cmd_name = parts[0].lower()
-        
-        if cmd_name == 'moveto':
-            x = float(parts[1])
-            y = float(parts[2])
-            axidraw_instance.moveto(x, y)
-            return jsonify({"success": True, "message": f"moved to ({x}, {y})"})
+        instance = ensure_interactive()
+        if instance is None:
+            return ERR_CONNECT_FIRST()
         
-        elif cmd_name == 'lineto':
-            x = float(parts[1])
-            y = float(parts[2])
-            axidraw_instance.lineto(x, y)
-            return jsonify({"success": True, "message": f"drew line to ({x}, {y})"})
+        cmd_name, args = parse_command(command)
+        ok, message = dispatch_one(instance, cmd_name, args)
         
-        elif cmd_name == 'penup':
-            axidraw_instance.penup()
-            return jsonify({"success": True, "message": "pen up"})
-        
-        elif cmd_name == 'pendown':
-            axidraw_instance.pendown()
-            return jsonify({"success": True, "message": "pen down"})
-        
-        elif cmd_name == 'home':
-            axidraw_instance.goto(0, 0)
-            return jsonify({"success": True, "message": "moved to home (0, 0)"})
-        
-        elif cmd_name == 'goto':
-            x = float(parts[1])
-            y = float(parts[2])
-            axidraw_instance.goto(x, y)
-            return jsonify({"success": True, "message": f"moved to ({x}, {y})"})
-        
-        elif cmd_name == 'move':
-            dx = float(parts[1])
-            dy = float(parts[2])
-            axidraw_instance.move(dx, dy)
-            return jsonify({"success": True, "message": f"moved by ({dx}, {dy})"})
-        
-        elif cmd_name == 'line':
-            dx = float(parts[1])
-            dy = float(parts[2])
-            axidraw_instance.line(dx, dy)
-            return jsonify({"success": True, "message": f"drew line by ({dx}, {dy})"})
-        
-        elif cmd_name == 'go':
-            dx = float(parts[1])
-            dy = float(parts[2])
-            axidraw_instance.go(dx, dy)
-            return jsonify({"success": True, "message": f"moved by ({dx}, {dy})"})
-        
-        elif cmd_name == 'delay':
-            time_ms = int(parts[1])
-            axidraw_instance.delay(time_ms)
-            return jsonify({"success": True, "message": f"delayed {time_ms} ms"})
-        
-        elif cmd_name == 'draw_path':
-            if len(parts) < 5 or (len(parts) - 1) % 2 != 0:
-                return jsonify({"success": False, "error": "draw_path requires at least 4 numbers (x1 y1 x2 y2 ...)"}), 400
-            coords = [float(p) for p in parts[1:]]
-            # pyaxidraw expects a list of 2-element lists (mutable), not tuples
-            vertex_list = [[coords[i], coords[i + 1]] for i in range(0, len(coords), 2)]
-            axidraw_instance.draw_path(vertex_list)
-            return jsonify({"success": True, "message": f"drew path with {len(vertex_list)} points"})
-        
-        elif cmd_name == 'turtle_pos':
-            pos = axidraw_instance.turtle_pos()
-            return jsonify({"success": True, "message": f"turtle_pos: ({pos[0]:.4f}, {pos[1]:.4f})"})
-        
-        elif cmd_name == 'current_pos':
-            pos = axidraw_instance.current_pos()
-            return jsonify({"success": True, "message": f"current_pos: ({pos[0]:.4f}, {pos[1]:.4f})"})
-        
-        else:
-            return jsonify({"success": False, "error": f"Unknown command: {cmd_name}"}), 400
+        if not ok:
+            return _json({"success": False, "error": message}, 400)
+        return _json({"success": True, "message": message})
             
     except Exception as e:
-        print(f"Error executing command '{command}': {e}")
-        return jsonify({"success": False, "error": str(e)}), 500
+        logger.warning("Error executing command '%s': %s", command, e)
+        return _json({"success": False, "error": str(e)}, 500)
+    finally:
+        hardware_lock.release()
 
 
-def run_plot(svg, layer, pen_pos_up, pen_pos_down, speed_penup, speed_pendown):
-    """Run plot in a background thread. layer can be None (all), int (one), or list of ints (multiple)."""
-    global axidraw_instance, plot_instance, paused_svg, paused_plot_settings, plot_thread, plot_active
+@app.route('/cmd_batch', methods=['POST'])
+def cmd_batch():
+    """Execute a list of commands in one request, holding the plotter for the whole batch."""
+    data = _request_json()
+    commands = data.get('commands', [])
+    # A bare string would otherwise run one character at a time
+    if not isinstance(commands, list) or not all(isinstance(c, str) for c in commands):
+        return ERR_BAD_COMMANDS()
     
+    # Don't park the request thread behind another command; the UI retries on 429
+    if not hardware_lock.acquire(blocking=False):
+        return ERR_BUSY()
     try:
-        # Disconnect any existing interactive session
-        if axidraw_instance is not None:
-            try:
-                axidraw_instance.disconnect()
-            except Exception as e:
-                print(f"Warning: Error disconnecting interactive session: {e}")
-            axidraw_instance = None
-        
-        # Clear any previous paused SVG and settings
-        paused_svg = None
-        paused_plot_settings = None
-        
-        # Create new plotter instance for plotting
-        plot_instance = create_plotter_instance()
+        instance = ensure_interactive()
+        if instance is None:
+            return ERR_CONNECT_FIRST()
+        results = run_batch(instance, commands)
+    finally:
+        hardware_lock.release()
+    
+    success = all(r["success"] for r in results)
+    return _json({"success": success, "results": results})
+
+
+def run_batch(instance, commands):
+    """Run a list of commands in order on instance (caller holds hardware_lock). Returns the per-command results."""
+    results = []
+    # Position reads in the middle of a batch are stale by the time the
+    # client sees them, so only the last one is answered, after all moves.
+    last_query = None
+    
+    for command in commands:
+        command = command.strip()
+        if not command:
+            continue
+        cmd_name, args = parse_command(command)
         
-        # Setup plot with SVG
-        plot_instance.plot_setup(svg)
+        if cmd_name in ('turtle_pos', 'current_pos'):
+            last_query = (command, cmd_name, args)
+            continue
         
-        plot_instance.options.pen_pos_up = pen_pos_up
-        plot_instance.options.pen_pos_down = pen_pos_down
-        plot_instance.options.speed_penup = speed_penup
-        plot_instance.options.speed_pendown = speed_pendown
+        try:
+            ok, message = dispatch_one(instance, cmd_name, args)
+        except Exception as e:
+            logger.warning("Error executing command '%s': %s", command, e)
+            ok, message = False, str(e)
+        results.append({"command": command, "success": ok, "message": message})
         
-        # Mark plot as active before starting
-        plot_active = True
+        # Stop at the first failure so later moves don't run from an unexpected position
+        if not ok:
+            break
+    else:
+        if last_query is not None:
+            command, cmd_name, args = last_query
+            try:
+                ok, message = dispatch_one(instance, cmd_name, args)
+            except Exception as e:
+                logger.warning("Error executing command '%s': %s", command, e)
+                ok, message = False, str(e)
+            results.append({"command": command, "success": ok, "message": message})
+    
+    return results
+
+
+# Markers for content _strip_svg_for_plot() can remove; an SVG without any is passed through unparsed
+SVG_STRIP_MARKERS = ('image', '<!--', 'metadata', 'defs')
+SVG_STRIP_MARKERS_BYTES = tuple(marker.encode() for marker in SVG_STRIP_MARKERS)
+# url(#id) and href="#id" style references to other elements
+SVG_REF_RE = re.compile(r'#([^\s"\'()#]+)')
+SVG_PARSER = etree.XMLParser(huge_tree=True, resolve_entities=False, no_network=True)
+
+
+def _svg_text(svg):
+    """SVG as str for plot_setup(); uploaded bytes are decoded once here."""
+    if isinstance(svg, bytes):
+        return svg.decode('utf-8', 'replace')
+    return svg
+
+
+def _strip_svg_for_plot(svg):
+    """Drop SVG content the plotter never draws: raster <image>s, comments, <metadata> and unreferenced <defs> children.
+    
+    svg may be str (JSON upload) or bytes (multipart upload); the result is str.
+    <style> is kept: it is small, and class-based display/visibility rules can
+    decide what gets plotted. Returns svg unchanged if it can't be parsed (plot_setup
+    reports the error) or contains nothing to strip.
+    """
+    is_bytes = isinstance(svg, bytes)
+    markers = SVG_STRIP_MARKERS_BYTES if is_bytes else SVG_STRIP_MARKERS
+    if not any(marker in svg for marker in markers):
+        return _svg_text(svg)
+    try:
+        root = etree.fromstring(svg if is_bytes else svg.encode(), SVG_PARSER)
+    except (etree.XMLSyntaxError, ValueError):
+        return _svg_text(svg)
+    
+    removed = False
+    # Ids referenced from anywhere in the document: href/xlink:href and url(#id)
+    # in attributes, and url(#id) in <style> sheets
+    referenced = set()
+    for el in root.iter(tag=etree.Element):
+        for value in el.attrib.values():
+            if '#' in value:
+                referenced.update(SVG_REF_RE.findall(value))
+        if el.text and '#' in el.text and etree.QName(el).localname == 'style':
+            referenced.update(SVG_REF_RE.findall(el.text))
+    
+    for el in list(root.iter()):
+        parent = el.getparent()
+        if parent is None:
+            continue
+        if el.tag is etree.Comment:
+            drop = True
+        elif isinstance(el.tag, str):
+            name = etree.QName(el).localname
+            # A <defs> child stays if it or anything inside it is referenced:
+            # cairo output nests <symbol id="glyph0-1"> in an id-less <g>
+            drop = (name in ('image', 'metadata')
+                    or (etree.QName(parent).localname == 'defs' and name != 'style'
+                        and not any(d.get('id') in referenced
+                                    for d in el.iter(tag=etree.Element))))
+        else:
+            drop = False
+        if drop:
+            # Keep the text that followed the removed element in the document
+            if el.tail and el.tail.strip():
+                previous = el.getprevious()
+                if previous is not None:
+                    previous.tail = (previous.tail or '') + el.tail
+                else:
+                    parent.text = (parent.text or '') + el.tail
+            parent.remove(el)
+            removed = True
+    
+    if not removed:
+        return _svg_text(svg)
+    # Serialize the whole tree, not just root: that keeps the DOCTYPE, whose
+    # internal subset defines the entities (&st0; ...) Illustrator exports use
+    return etree.tostring(root.getroottree(), encoding='unicode')
+
+
+# Plot jobs run in a child process: pyaxidraw's path planning is pure Python and would
+# otherwise hold this process's GIL against the request threads. 'spawn', because
+# forking this multi-threaded process could copy locks held by other threads.
+PLOT_MP = multiprocessing.get_context('spawn')
+# Seconds a plot child gets to pause after SIGINT (finish the current move, lift
+# the pen) before it is terminated
+PLOT_STOP_TIMEOUT = 10
+
+
+def _run_in_child(svg, mode, layers=None, options=None):
+    """Run one plot job in a child process (plot_runner) and wait for it.
+    
+    Returns (error_code, output_svg, layer). Raises RuntimeError if the job failed
+    or the process was terminated (e.g. it did not pause after Ctrl+C).
+    """
+    receiver, sender = PLOT_MP.Pipe(duplex=False)
+    process = PLOT_MP.Process(
+        target=plot_runner.run_plot_job,
+        args=(sender, get_plotter_type(), svg, mode, layers, options),
+        name='hotplot-plot-job',
+        daemon=True,
+    )
+    process.start()
+    sender.close()
+    
+    # Mark plot as active before waiting on it
+    with STATE_LOCK:
+        STATE.plot_process = process
+        STATE.plot_active.set()
+    notify_state_changed()
+    
+    try:
+        result = receiver.recv()
+    except EOFError:
+        result = None
+    finally:
+        receiver.close()
+        process.join()
+    
+    if result is None:
+        raise RuntimeError(f"Plot process stopped (exit code {process.exitcode})")
+    if result[0] is None:
+        raise RuntimeError(result[1])
+    return result
+
+
+def _set_paused(output_svg=None, settings=None):
+    """Replace the paused plot (None clears it) and free the previous one's shared memory."""
+    paused = PausedSvg(output_svg) if output_svg else None
+    with STATE_LOCK:
+        previous = STATE.paused_svg
+        STATE.paused_svg = paused
+        STATE.paused_settings = settings if paused is not None else None
+    if previous is not None:
+        previous.release()
+
+
+def _record_plot_result(error_code, output_svg, settings):
+    """Keep the paused plot (or clear it) according to the error code of a plot or resume job."""
+    if error_code in (plot_runner.PAUSED_BY_BUTTON, plot_runner.PAUSED_BY_KEYBOARD):
+        if error_code == plot_runner.PAUSED_BY_BUTTON:
+            logger.info("Plot paused by button press")
+        else:
+            logger.info("Plot paused by keyboard interrupt")
+        _set_paused(output_svg, settings)
+    elif error_code == 0:  # Completed normally
+        logger.info("Plot completed successfully")
+        _set_paused()
+
+
+@_exclusive_plotter
+def run_plot(svg, layer, settings):
+    """Run plot on the plot worker thread. layer can be None (all), int (one), or list of ints (multiple).
+    
+    settings holds the pen heights and speeds (PlotSettings without a layer). Returns the plot's error code, or None if the job failed before reaching the plotter.
+    """
+    try:
+        # Clear any previous paused SVG and settings
+        _set_paused()
         
-        # Normalize layer: list of ints to plot in sequence, or single int, or None for all
+        # Normalize layer: list of ints to plot in sequence, or single int, or None for all.
+        # Duplicates are dropped (keeping order) so no layer is plotted twice.
         layers_to_plot = None
         if layer is not None:
             if isinstance(layer, list):
-                layers_to_plot = [int(x) for x in layer]
+                layers_to_plot = list(dict.fromkeys(int(x) for x in layer))
             else:
                 layers_to_plot = [int(layer)]
         
-        if not layers_to_plot:
-            # Plot all layers
-            plot_instance.options.mode = "plot"
-            output_svg = plot_instance.plot_run(True)
-        else:
-            # Plot selected layer(s) in sequence (same pen/settings for all)
-            output_svg = None
-            for layer_num in layers_to_plot:
-                plot_instance.options.mode = "layers"
-                plot_instance.options.layer = layer_num
-                output_svg = plot_instance.plot_run(True)
-                error_code = plot_instance.errors.code
-                if error_code == 102:  # Paused by button
-                    break
-                if error_code == 103:  # Paused by keyboard interrupt
-                    break
-        
-        # Check error code to see if plot was paused
-        error_code = plot_instance.errors.code
-        if error_code == 102:  # Paused by button
-            print("Plot paused by button press")
-            paused_svg = output_svg
-            # Store plot settings for resume (single layer when paused during multi-layer)
-            current_layer = plot_instance.options.layer if layers_to_plot else None
-            paused_plot_settings = {
-                "layer": current_layer,
-                "pen_pos_up": pen_pos_up,
-                "pen_pos_down": pen_pos_down,
-                "speed_penup": speed_penup,
-                "speed_pendown": speed_pendown
-            }
-        elif error_code == 103:  # Paused by keyboard interrupt
-            print("Plot paused by keyboard interrupt")
-            paused_svg = output_svg
-            current_layer = plot_instance.options.layer if layers_to_plot else None
-            paused_plot_settings = {
-                "layer": current_layer,
-                "pen_pos_up": pen_pos_up,
-                "pen_pos_down": pen_pos_down,
-                "speed_penup": speed_penup,
-                "speed_pendown": speed_pendown
-            }
-        elif error_code == 0:  # Completed normally
-            print("Plot completed successfully")
-            paused_svg = None
-            paused_plot_settings = None
+        # Stripping first also keeps the paused SVG (plot_run's output) small for
+        # resume and Return Home
+        error_code, output_svg, current_layer = _run_in_child(
+            _strip_svg_for_plot(svg), "layers" if layers_to_plot else "plot", layers_to_plot,
+            settings.options())
         
-        # Clean up plot instance
-        try:
-            plot_instance.disconnect()
-        except Exception as e:
-            print(f"Warning: Error disconnecting after plot: {e}")
-        plot_instance = None
+        # Store plot settings for resume (single layer when paused during multi-layer)
+        if current_layer is not None:
+            settings = replace(settings, layer=current_layer)
+        _record_plot_result(error_code, output_svg, settings)
+        return error_code
         
-    except Exception as e:
-        print(f"Error in plot thread: {e}")
-        # Clean up plot instance on error
-        if plot_instance is not None:
-            try:
-                plot_instance.disconnect()
-            except:
-                pass
-            plot_instance = None
-        paused_svg = None
-        paused_plot_settings = None
-    finally:
-        plot_active = False
-        plot_thread = None
-        # Restore interactive connection so the UI connection switch stays on
-        reconnect_interactive()
+    except Exception:
+        logger.exception("Error in plot thread")
+        _set_paused()
 
 
 @app.route('/plot', methods=['POST'])
 def plot():
-    """Plot an SVG with optional layer selection and settings."""
-    global plot_thread
+    """Plot an SVG with optional layer selection and settings.
     
-    data = request.get_json()
-    svg = data.get('svg', '').strip()
+    Accepts multipart/form-data (SVG as the 'svg' file part, layer and settings as
+    JSON in the 'params' field) or the older JSON body with the SVG in 'svg'.
+    """
+    # No .strip(): the SVG parser tolerates surrounding whitespace, and the SVG
+    # is handed to the worker as-is instead of being copied
+    svg_file = request.files.get('svg')
+    if svg_file is not None:
+        # Raw bytes go straight to lxml; no JSON string escaping or decoding here
+        svg = svg_file.read()
+        data = _request_json(request.form.get('params') or '{}')
+        svg_tag = b'<svg'
+    else:
+        data = _request_json()
+        svg = data.get('svg') or ''
+        svg_tag = '<svg'
     
     if not svg:
-        return jsonify({"success": False, "error": "SVG content is required"}), 400
+        return ERR_SVG_REQUIRED()
+    # Cheap sanity check so an obviously wrong upload fails here, not in the worker
+    if svg_tag not in svg[:SVG_SNIFF_BYTES]:
+        return ERR_SVG_INVALID()
     
-    # Check if a plot is already in progress
-    if plot_thread is not None and plot_thread.is_alive():
-        return jsonify({"success": False, "error": "Plot operation already in progress"}), 400
+    # Check if a plot is already in progress (and reserve the worker if not)
+    if not claim_plot_slot():
+        return ERR_PLOT_IN_PROGRESS()
     
     try:
         # Get parameters
         layer = data.get('layer')
-        settings = data.get('settings', {})
+        ui_settings = data.get('settings') or {}
+        settings = PlotSettings(**{
+            name: ui_settings[key] for key, name in _SETTINGS_FIELDS.items() if key in ui_settings
+        })
         
-        pen_pos_up = settings.get('pen_up', 70)
-        pen_pos_down = settings.get('pen_down', 40)
-        speed_penup = settings.get('speed_up', 75)
-        speed_pendown = settings.get('speed_down', 25)
+        # Hand the plot to the worker thread
+        start_plot_job(run_plot, svg, layer, settings)
         
-        # Start plot in background thread
-        plot_thread = threading.Thread(
-            target=run_plot,
-            args=(svg, layer, pen_pos_up, pen_pos_down, speed_penup, speed_pendown),
-            daemon=True
-        )
-        plot_thread.start()
-        
-        return jsonify({"success": True, "message": "Plot started successfully"})
+        return _json({"success": True, "message": "Plot started successfully"})
         
     except Exception as e:
-        print(f"Error starting plot: {e}")
-        plot_thread = None
-        return jsonify({"success": False, "error": str(e)}), 500
+        logger.exception("Error starting plot")
+        release_plot_slot()
+        return _json({"success": False, "error": str(e)}, 500)
 
 
 @app.route('/resume', methods=['POST'])
 def resume():
     """Resume a paused plot using res_plot mode."""
-    global axidraw_instance, plot_instance, plot_thread, paused_svg, paused_plot_settings, plot_active
+    with STATE_LOCK:
+        paused = STATE.paused_svg is not None
+    if not paused:
+        return ERR_NO_PAUSED_PLOT()
     
-    if paused_svg is None:
-        return jsonify({"success": False, "error": "No paused plot to resume"}), 400
+    # Check if a plot is already in progress (and reserve the worker if not)
+    if not claim_plot_slot():
+        return ERR_PLOT_IN_PROGRESS()
     
-    # Check if a plot is already in progress
-    if plot_thread is not None and plot_thread.is_alive():
-        return jsonify({"success": False, "error": "Plot operation already in progress"}), 400
+    # Take the paused state (plot is now resuming)
+    with STATE_LOCK:
+        temp_paused_svg = STATE.paused_svg
+        temp_paused_settings = STATE.paused_settings
+        STATE.paused_svg = None
+        STATE.paused_settings = None
+    if temp_paused_svg is None:
+        # Another request (Return Home) used up the paused plot in the meantime
+        release_plot_slot()
+        return ERR_NO_PAUSED_PLOT()
     
     try:
-        # Disconnect any existing instances
-        if axidraw_instance is not None:
-            try:
-                axidraw_instance.disconnect()
-            except Exception as e:
-                print(f"Warning: Error disconnecting interactive session: {e}")
-            axidraw_instance = None
-        
-        if plot_instance is not None:
-            try:
-                plot_instance.disconnect()
-            except Exception as e:
-                print(f"Warning: Error disconnecting plot session: {e}")
-            plot_instance = None
-        
-        # Get stored settings or use defaults (before clearing)
-        settings = paused_plot_settings or {}
-        layer = settings.get("layer")
-        pen_pos_up = settings.get("pen_pos_up", 70)
-        pen_pos_down = settings.get("pen_pos_down", 40)
-        speed_penup = settings.get("speed_penup", 75)
-        speed_pendown = settings.get("speed_pendown", 25)
-        
-        # Store paused state temporarily (will be passed to thread)
-        temp_paused_svg = paused_svg
-        temp_paused_settings = paused_plot_settings
-        
-        # Clear paused state (plot is now resuming)
-        paused_svg = None
-        paused_plot_settings = None
-        
-        # Create new plotter instance for resuming
-        plot_instance = create_plotter_instance()
-        
-        # Setup plot with paused SVG
-        plot_instance.plot_setup(temp_paused_svg)
-        
-        # Set resume mode
-        plot_instance.options.mode = "res_plot"
-        
-        # Restore plot settings
-        if layer is not None:
-            plot_instance.options.layer = int(layer)
-        plot_instance.options.pen_pos_up = pen_pos_up
-        plot_instance.options.pen_pos_down = pen_pos_down
-        plot_instance.options.speed_penup = speed_penup
-        plot_instance.options.speed_pendown = speed_pendown
-        
-        # Mark plot as active and start resume
-        plot_active = True
-        
-        # Execute resume plot in background thread
-        plot_thread = threading.Thread(
-            target=run_resume_plot,
-            args=(temp_paused_settings,),
-            daemon=True
-        )
-        plot_thread.start()
-        
-        return jsonify({"success": True, "message": "Plot resumed successfully"})
+        # Reconnecting and re-parsing the SVG happen on the worker, not in this request
+        start_plot_job(run_resume_plot, temp_paused_svg, temp_paused_settings)
+        return _json({"success": True, "message": "Plot resumed successfully"})
         
     except Exception as e:
-        print(f"Error resuming plot: {e}")
-        plot_instance = None
-        plot_thread = None
-        return jsonify({"success": False, "error": str(e)}), 500
+        logger.exception("Error resuming plot")
+        temp_paused_svg.release()
+        release_plot_slot()
+        return _json({"success": False, "error": str(e)}, 500)
 
 
-def run_resume_plot(temp_settings):
-    """Run resumed plot in a background thread."""
-    global plot_instance, paused_svg, paused_plot_settings, plot_thread, plot_active
-    
+@_exclusive_plotter
+def run_resume_plot(temp_paused_svg, temp_settings):
+    """Run resumed plot on the plot worker thread. Returns the error code, or None on failure."""
     try:
-        # Execute plot with output=True to capture paused SVG if interrupted again
-        output_svg = plot_instance.plot_run(True)
+        # Get stored settings or use defaults
+        settings = temp_settings or PlotSettings()
         
-        # Get settings from temp_settings or plot_instance options
-        if temp_settings:
-            layer = temp_settings.get("layer")
-            pen_pos_up = temp_settings.get("pen_pos_up", 70)
-            pen_pos_down = temp_settings.get("pen_pos_down", 40)
-            speed_penup = temp_settings.get("speed_penup", 75)
-            speed_pendown = temp_settings.get("speed_pendown", 25)
-        else:
-            layer = plot_instance.options.layer if plot_instance.options.mode == "layers" else None
-            pen_pos_up = plot_instance.options.pen_pos_up
-            pen_pos_down = plot_instance.options.pen_pos_down
-            speed_penup = plot_instance.options.speed_penup
-            speed_pendown = plot_instance.options.speed_pendown
-        
-        # Check error code to see if plot was paused again
-        error_code = plot_instance.errors.code
-        if error_code == 102:  # Paused by button
-            print("Plot paused by button press")
-            paused_svg = output_svg
-            paused_plot_settings = {
-                "layer": layer,
-                "pen_pos_up": pen_pos_up,
-                "pen_pos_down": pen_pos_down,
-                "speed_penup": speed_penup,
-                "speed_pendown": speed_pendown
-            }
-        elif error_code == 103:  # Paused by keyboard interrupt
-            print("Plot paused by keyboard interrupt")
-            paused_svg = output_svg
-            paused_plot_settings = {
-                "layer": layer,
-                "pen_pos_up": pen_pos_up,
-                "pen_pos_down": pen_pos_down,
-                "speed_penup": speed_penup,
-                "speed_pendown": speed_pendown
-            }
-        elif error_code == 0:  # Completed normally
-            print("Plot completed successfully")
-            paused_svg = None
-            paused_plot_settings = None
+        # Plot with output=True (in the child) to capture paused SVG if interrupted again
+        error_code, output_svg, _ = _run_in_child(
+            temp_paused_svg.ref, "res_plot", options=settings.options())
         
-        # Clean up plot instance
-        try:
-            plot_instance.disconnect()
-        except Exception as e:
-            print(f"Warning: Error disconnecting after plot: {e}")
-        plot_instance = None
+        # Paused again: the same settings apply to the next resume
+        _record_plot_result(error_code, output_svg, settings)
+        return error_code
         
-    except Exception as e:
-        print(f"Error in resume plot thread: {e}")
-        # Clean up plot instance on error
-        if plot_instance is not None:
-            try:
-                plot_instance.disconnect()
-            except:
-                pass
-            plot_instance = None
-        paused_svg = None
-        paused_plot_settings = None
+    except Exception:
+        logger.exception("Error in resume plot thread")
+        _set_paused()
     finally:
-        plot_active = False
-        plot_thread = None
-        reconnect_interactive()
+        # Taken out of STATE by /resume, so this job owns the shared memory
+        temp_paused_svg.release()
 
 
-@app.route('/home', methods=['POST'])
 def home():
     """Move carriage to home corner (0, 0). Only valid when plot is paused. Clears paused state so Play button shows again."""
-    global paused_svg, paused_plot_settings
+    with STATE_LOCK:
+        paused = STATE.paused_svg is not None
+    if not paused:
+        return ERR_HOME_NOT_PAUSED()
     
+    # The move runs on the plot worker, so it can't overlap a plot or resume
+    if not claim_plot_slot():
+        return ERR_PLOT_IN_PROGRESS()
+    
+    # Read the paused plot only now that the slot is held: nothing can take
+    # (and release) it from here until run_home has finished with it
+    with STATE_LOCK:
+        paused_svg = STATE.paused_svg
     if paused_svg is None:
-        return jsonify({"success": False, "error": "Return Home is only available when a plot is paused"}), 400
+        # A resume used up the paused plot in the meantime
+        release_plot_slot()
+        return ERR_HOME_NOT_PAUSED()
     
     try:
-        plotter_type = get_plotter_type()
-        home_instance = create_plotter_instance()
-        home_instance.plot_setup(paused_svg)
+        start_plot_job(run_home, paused_svg)
+        return _json({"success": True, "message": "Returning to home corner (0, 0)"})
         
+    except Exception as e:
+        logger.exception("Error returning to home")
+        release_plot_slot()
+        return _json({"success": False, "error": str(e)}, 500)
+
+
+@_exclusive_plotter
+def run_home(paused_svg):
+    """Return the carriage to (0, 0) on the plot worker thread, then drop the paused plot.
+    
+    Returns the move's error code, or None on failure.
+    """
+    try:
         # Handle API differences: AxiDraw uses res_home mode, NextDraw uses find_home mode
-        if plotter_type == PLOTTER_AXIDRAW:
-            home_instance.options.mode = "res_home"
+        if get_plotter_type() == PLOTTER_AXIDRAW:
+            # res_home reads the pause position stored in the paused SVG
+            error_code, _, _ = _run_in_child(paused_svg.ref, "res_home")
         else:
-            # NextDraw: use find_home mode (res_home was removed)
-            home_instance.options.mode = "find_home"
-        
-        home_instance.plot_run()
-        home_instance.disconnect()
+            # NextDraw: use find_home mode (res_home was removed). find_home doesn't
+            # use the document, so skip parsing the (possibly large) paused SVG.
+            error_code, _, _ = _run_in_child(None, "find_home")
+        logger.info("Returned to home corner (0, 0)")
         
         # Clear paused state so UI shows Play button again (no resume option)
-        paused_svg = None
-        paused_plot_settings = None
+        _set_paused()
+        return error_code
         
-        # Restore interactive connection so the UI connection switch stays on
-        reconnect_interactive()
-        
-        return jsonify({"success": True, "message": "Returned to home corner (0, 0)"})
-        
-    except Exception as e:
-        print(f"Error returning to home: {e}")
-        return jsonify({"success": False, "error": str(e)}), 500
+    except Exception:
+        logger.exception("Error returning to home")
+
+
+# Connection actions share one route (POST /conn/<action>) to keep the URL map small
+CONN_ACTIONS = {
+    'connect': connect,
+    'disconnect': disconnect,
+    'home': home,
+}
+
+
+@app.route('/conn/<action>', methods=['POST'])
+def conn(action):
+    """Connect, disconnect or return home, selected by the URL."""
+    handler = CONN_ACTIONS.get(action)
+    if handler is None:
+        return _json({"success": False, "error": f"Unknown action: {action}"}, 404)
+    return handler()
+
+
+class NoDelayRequestHandler(WSGIRequestHandler):
+    """Dev-server request handler that sets TCP_NODELAY on every connection."""
+    # Small JSON responses (/cmd, /state) go out immediately instead of waiting
+    # on Nagle's algorithm for the client's ACK
+    disable_nagle_algorithm = True
 
 
 def signal_handler(signum, frame):
-    """Handle SIGINT (Ctrl+C) to stop active plot."""
-    global plot_instance, plot_active
-    if plot_active and plot_instance is not None:
-        print("Interrupting plot via Ctrl+C...")
+    """Handle SIGINT (Ctrl+C). Only sets a flag; signal_watcher_loop pauses the plot."""
+    # Nothing here may block or take locks: the handler interrupts the main thread
+    # at an arbitrary point, possibly while it already holds one.
+    sigint_event.set()
+
+
+def signal_watcher_loop():
+    """Pause the active plot whenever Ctrl+C was pressed (runs outside the signal handler).
+    
+    The plot child gets SIGINT, so pyaxidraw pauses cleanly (error code 103) and
+    returns a resumable SVG. It is terminated only if it has not exited after
+    PLOT_STOP_TIMEOUT seconds.
+    """
+    while True:
+        sigint_event.wait()
+        sigint_event.clear()
+        with STATE_LOCK:
+            plot_process = STATE.plot_process if STATE.plot_active.is_set() else None
+        if plot_process is None:
+            continue
+        logger.info("Interrupting plot via Ctrl+C...")
+        # A Ctrl+C typed in the terminal has already reached the child (same
+        # process group); it ignores every SIGINT after the first, so this one
+        # is for when it has not (e.g. the signal was sent to the server only)
         try:
-            plot_instance.disconnect()
-        except:
-            pass
-        plot_instance = None
-        plot_active = False
+            os.kill(plot_process.pid, signal.SIGINT)
+        except ProcessLookupError:
+            continue
+        # Wait on the sentinel rather than join(): the plot worker reaps the process
+        if not mp_wait([plot_process.sentinel], PLOT_STOP_TIMEOUT):
+            logger.warning("Plot did not pause within %s s; terminating it", PLOT_STOP_TIMEOUT)
+            # The plot worker sees the process end and clears the plot state
+            plot_process.terminate()
+
+
+# The UI page is read once at server start (init_server) and served from memory
+INDEX_PATH = os.path.join(app.static_folder, 'index.html')
+index_cache = None
+
+
+def init_server():
+    """One-time startup of the server process: logging thread, plotter info, UI page, exit hooks.
+    
+    Called from __main__ and from gunicorn's post_worker_init hook, never at import:
+    plot children ('spawn') re-import this module and must not start any of this.
+    """
+    global index_cache
+    logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    log_listener.start()
+    atexit.register(log_listener.stop)
+    # Don't leave the paused plot's shared memory behind when the server exits
+    atexit.register(_set_paused)
+    refresh_plotter_info()
+    index_cache = _read_index()
 
 
 if __name__ == '__main__':
+    init_server()
     # Register signal handler in main thread for Ctrl+C support
     signal.signal(signal.SIGINT, signal_handler)
+    threading.Thread(target=signal_watcher_loop, name='signal-watcher', daemon=True).start()
     
-    print("Starting Flask server on http://localhost:3000/")
-    app.run(host='127.0.0.1', port=3000, debug=True)
+    logger.info("Starting Flask server on http://localhost:3000/")
+    # Serve each request on its own thread so /state polls are never queued
+    # behind a request that is blocked on USB I/O (e.g. /connect or /home).
+    # Debug mode (reloader + debugger) is opt-in: the reloader polls every
+    # source file once a second and the debugger wraps every request.
+    debug = os.environ.get('HOTPLOT_DEBUG') == '1'
+    app.run(host='127.0.0.1', port=3000, debug=debug, threaded=True,
+            request_handler=NoDelayRequestHandler)
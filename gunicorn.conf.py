@@ -0,0 +1,21 @@
+"""
+Gunicorn settings for HotPlot: gunicorn app:app (picks this file up automatically).
+"""
+
+# One plotter, one process: the plotter session, paused plot and plot worker
+# thread live in module globals of app.py and must not be split across workers
+workers = 1
+# A handful of threads is enough for /state, /events and commands to run next
+# to each other; more only adds context switching
+worker_class = 'gthread'
+threads = 8
+bind = '127.0.0.1:3000'
+# /events streams stay open indefinitely and plots run for minutes; never
+# kill the worker for being "silent"
+timeout = 0
+
+
+def post_worker_init(worker):
+    """Run the app's server startup (logging thread, UI page) once the worker has loaded it."""
+    import app
+    app.init_server()
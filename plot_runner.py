@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Plot job runner for a child process.
+Runs one plot_run() job (plot, layers, resume, return home) away from the server
+process, so pyaxidraw's path planning never competes for the server's GIL.
+
+This module is imported by 'spawn' children, so it must stay free of import-time
+side effects (no Flask app, threads or logging setup) and must not import app.py.
+(When the server is started as 'python app.py', multiprocessing also re-imports
+app.py in the child as __mp_main__. The server's startup (logging thread, UI page,
+exit hooks) lives in app.init_server(), which that import does not run, so the
+child only builds the module's objects and never touches the plotter.)
+"""
+
+import signal
+from multiprocessing import shared_memory
+
+from plotter_adapter import create_plotter_instance
+
+# Error codes pyaxidraw and NextDraw report when a plot is paused
+PAUSED_BY_BUTTON = 102
+PAUSED_BY_KEYBOARD = 103
+
+
+def _interrupt_once(signum, frame):
+    """SIGINT handler: raise KeyboardInterrupt for the first SIGINT and ignore the rest.
+    
+    pyaxidraw pauses the plot on KeyboardInterrupt. A Ctrl+C in the server's terminal
+    reaches this process directly and the server forwards one as well, so a second
+    interrupt must not break into the pause (pen lift, output SVG).
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    raise KeyboardInterrupt
+
+
+def _read_shared_svg(name, size):
+    """Read the paused SVG from the server's shared memory block (app.PausedSvg)."""
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        return bytes(shm.buf[:size]).decode('utf-8')
+    finally:
+        shm.close()
+
+
+def run_plot_job(conn, plotter_type, svg, mode, layers=None, options=None):
+    """
+    Run one plot job and send its result back over conn.
+
+    Args:
+        conn: Sending end of a multiprocessing Pipe
+        plotter_type: 'axidraw' or 'nextdraw'. Passed explicitly: the child does not
+            share the server's plotter type setting
+        svg: SVG string, (name, size) of a shared memory block holding the SVG
+            (paused plots), or None for modes that don't use a document (find_home)
+        mode: Plot mode (plot, layers, res_plot, res_home, find_home)
+        layers: Layer numbers to plot in sequence (mode 'layers'), or None
+        options: Extra plot options (pen heights, speeds, layer), set on instance.options
+
+    Sends (error_code, output_svg, layer): layer is the layer being plotted when the
+    job stopped (None unless plotting by layer). On failure sends (None, message, None).
+    """
+    # The server pauses a plot with SIGINT (pyaxidraw then reports PAUSED_BY_KEYBOARD)
+    signal.signal(signal.SIGINT, _interrupt_once)
+
+    instance = None
+    try:
+        if isinstance(svg, tuple):
+            svg = _read_shared_svg(*svg)
+        instance = create_plotter_instance(plotter_type)
+        instance.plot_setup(svg)
+        for name, value in (options or {}).items():
+            setattr(instance.options, name, value)
+        instance.options.mode = mode
+
+        if layers:
+            # The SVG was parsed once by plot_setup() above; each plot_run() only
+            # switches options.layer on the same instance, so there is no re-parse
+            # and no reconnect between layers. (Neither API accepts a list of
+            # layers in one run, so one plot_run per layer is required.)
+            output_svg = None
+            for layer in layers:
+                instance.options.layer = layer
+                output_svg = instance.plot_run(True)
+                if instance.errors.code in (PAUSED_BY_BUTTON, PAUSED_BY_KEYBOARD):
+                    break
+            current_layer = instance.options.layer
+        else:
+            output_svg = instance.plot_run(True)
+            current_layer = None
+
+        conn.send((instance.errors.code, output_svg, current_layer))
+    except Exception as e:
+        conn.send((None, f"{type(e).__name__}: {e}", None))
+    finally:
+        if instance is not None:
+            try:
+                instance.disconnect()
+            except Exception:
+                pass
+        conn.close()
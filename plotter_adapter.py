@@ -4,51 +4,63 @@ Plotter adapter module for supporting both AxiDraw and NextDraw plotters.
 Provides a unified interface that handles API differences transparently.
 """
 
+import sys
+import logging
+import functools
+import importlib
+import importlib.util
+from typing import Callable, NamedTuple
+
+logger = logging.getLogger('hotplot.adapter')
+
 # Plotter type constants
 PLOTTER_AXIDRAW = "axidraw"
 PLOTTER_NEXTDRAW = "nextdraw"
+# All valid plotter types (for validating user input)
+PLOTTER_TYPES = frozenset((PLOTTER_AXIDRAW, PLOTTER_NEXTDRAW))
 
-# Global plotter type setting (default to AxiDraw for backward compatibility)
-_current_plotter_type = PLOTTER_AXIDRAW
 
-# Cache for NextDraw availability (checked dynamically)
-_nextdraw_available_cache = None
+def _import(module_name):
+    """Return an already imported module from sys.modules, importing it only on a miss."""
+    module = sys.modules.get(module_name)
+    if module is None:
+        module = importlib.import_module(module_name)
+    return module
 
 
+@functools.cache
 def _check_nextdraw_availability():
-    """Check if NextDraw is available by attempting to import it."""
-    global _nextdraw_available_cache
-    
-    # Always re-check (don't cache) to detect newly installed libraries
-    # This allows detection without server restart
-    try:
-        from nextdraw import NextDraw
-        _nextdraw_available_cache = True
-        return True
-    except ImportError:
-        _nextdraw_available_cache = False
-        return False
+    """Check if NextDraw is installed, without importing it. The result is cached (see refresh_plotter_availability)."""
+    return importlib.util.find_spec("nextdraw") is not None
 
 
-# Initial check
-_check_nextdraw_availability()
+def refresh_plotter_availability():
+    """
+    Forget the cached NextDraw availability, so the next check detects a newly installed library.
+    
+    Call this where a re-check is wanted (the app does on GET /config, i.e. when
+    the UI loads); everything else reads the cached result.
+    """
+    _check_nextdraw_availability.cache_clear()
 
 
 def get_plotter_type():
     """Get the current plotter type."""
-    return _current_plotter_type
+    return _DISPATCH.type
 
 
 def set_plotter_type(plotter_type):
     """Set the current plotter type. Valid values: 'axidraw' or 'nextdraw'."""
-    global _current_plotter_type
-    if plotter_type not in (PLOTTER_AXIDRAW, PLOTTER_NEXTDRAW):
+    global _DISPATCH
+    dispatch = _DISPATCH_BY_TYPE.get(plotter_type)
+    if dispatch is None:
         raise ValueError(f"Invalid plotter type: {plotter_type}. Must be 'axidraw' or 'nextdraw'")
-    _current_plotter_type = plotter_type
+    # One assignment switches the type and all its handlers together
+    _DISPATCH = dispatch
 
 
 def is_nextdraw_available():
-    """Check if NextDraw library is available. Re-checks dynamically."""
+    """Check if NextDraw library is available (cached; see refresh_plotter_availability)."""
     return _check_nextdraw_availability()
 
 
@@ -67,54 +79,139 @@ def create_plotter_instance(plotter_type=None):
         ValueError: If invalid plotter type is specified
     """
     if plotter_type is None:
-        plotter_type = _current_plotter_type
-    
+        plotter_type = _DISPATCH.type
+    # Deliberately a new object each call, not a shared instance per type: a
+    # plot job opens the port in its own child process (plot_runner), so the
+    # interactive session is closed before every plot anyway, and with the
+    # class cached below, building the object is cheap next to the USB connect.
+    return _plotter_class(plotter_type)()
+
+
+# Plotter classes once imported, so later instances skip the import (and, for
+# NextDraw, the availability check)
+_AXI_CLASS = None
+_NEXT_CLASS = None
+
+
+def _plotter_class(plotter_type):
+    """Import and return the plotter class (AxiDraw or NextDraw) for a plotter type."""
+    global _AXI_CLASS, _NEXT_CLASS
     if plotter_type == PLOTTER_AXIDRAW:
-        from pyaxidraw import axidraw
-        return axidraw.AxiDraw()
+        if _AXI_CLASS is None:
+            _AXI_CLASS = _import("pyaxidraw.axidraw").AxiDraw
+        return _AXI_CLASS
     
     elif plotter_type == PLOTTER_NEXTDRAW:
-        # Re-check availability dynamically
-        if not _check_nextdraw_availability():
-            raise ImportError(
-                "NextDraw library is not installed. "
-                "Please install it to use NextDraw support. "
-                "See README.md for installation instructions."
-            )
-        # Import NextDraw fresh (availability check already verified it's available)
-        # This avoids any potential issues with module caching
-        from nextdraw import NextDraw
-        return NextDraw()
+        if _NEXT_CLASS is None:
+            if not _check_nextdraw_availability():
+                raise ImportError(
+                    "NextDraw library is not installed. "
+                    "Please install it to use NextDraw support. "
+                    "See README.md for installation instructions."
+                )
+            _NEXT_CLASS = _import("nextdraw").NextDraw
+        return _NEXT_CLASS
     
     else:
         raise ValueError(f"Invalid plotter type: {plotter_type}. Must be 'axidraw' or 'nextdraw'")
 
 
+def build_command(name, *args):
+    """
+    Build a USB (EBB) command string with its \\r terminator already in place.
+    
+    Example: build_command("EM", 0, 0) returns "EM,0,0\\r". Build fixed commands
+    once (e.g. as module constants) and pass them to usb_command(): AxiDraw sends
+    them as they are, NextDraw only strips the terminator.
+    """
+    return ",".join((name, *map(str, args))) + "\r"
+
+
+# Commands and queries with the terminator each plotter expects. Cached: the
+# same few strings (SP,0 / SP,1 / EM,... / QB) are sent over and over, so each
+# normalized string is built once. Bounded, since moves embed coordinates.
+# Commands may also be given as ASCII bytes; both plotter libraries take str
+# (and encode it themselves), so bytes are decoded here, once per command.
+
+@functools.lru_cache(maxsize=256)
+def _normalize_axi(command):
+    if isinstance(command, bytes):
+        command = command.decode('ascii')
+    # AxiDraw requires \r at the end
+    return command if command[-1:] == '\r' else command + '\r'
+
+
+@functools.lru_cache(maxsize=256)
+def _normalize_next(command):
+    if isinstance(command, bytes):
+        command = command.decode('ascii')
+    # NextDraw does not need \r (it's added automatically)
+    # Remove \r if present to avoid double-adding
+    return command[:-1] if command[-1:] == '\r' else command
+
+
+# Per-plotter senders for usb_command/usb_query.
+# These stay plain Python on purpose. There is no numeric work here for numba
+# to compile, and importing it would cost seconds at startup. A C extension
+# wouldn't pay off either: plot jobs stream their commands from inside
+# pyaxidraw/NextDraw (in the plot child process), not through this module, and
+# the few commands sent here each wait on a serial round trip that dwarfs the
+# Python call overhead.
+# plotter_instance.usb_command(...) is called directly rather than through a
+# cached bound method: CPython's method-call specialization already skips
+# creating the bound method, and a cache (instance attribute or
+# WeakKeyDictionary) measured slower. usb_command_batch() hoists the method
+# where a loop makes that worthwhile.
+
+def _axidraw_cmd(plotter_instance, command):
+    plotter_instance.usb_command(_normalize_axi(command))
+
+
+def _axidraw_query(plotter_instance, query):
+    return plotter_instance.usb_query(_normalize_axi(query))
+
+
+def _nextdraw_cmd(plotter_instance, command):
+    plotter_instance.usb_command(_normalize_next(command))
+
+
+def _nextdraw_query(plotter_instance, query):
+    return plotter_instance.usb_query(_normalize_next(query))
+
+
+class _Dispatch(NamedTuple):
+    """Everything that depends on the plotter type."""
+    type: str
+    send: Callable  # usb_command sender
+    query: Callable  # usb_query sender
+    normalize: Callable  # command normalizer (str or bytes in, str in the API's line format out)
+
+
+# One _Dispatch per type. The current one is swapped as a whole by
+# set_plotter_type(), so a caller running at the same time sees either the old
+# or the new plotter's handlers, never a mix, without a lock.
+_DISPATCH_BY_TYPE = {
+    PLOTTER_AXIDRAW: _Dispatch(PLOTTER_AXIDRAW, _axidraw_cmd, _axidraw_query, _normalize_axi),
+    PLOTTER_NEXTDRAW: _Dispatch(PLOTTER_NEXTDRAW, _nextdraw_cmd, _nextdraw_query, _normalize_next),
+}
+
+# Global plotter type setting (default to AxiDraw for backward compatibility)
+_DISPATCH = _DISPATCH_BY_TYPE[PLOTTER_AXIDRAW]
+
+
 def usb_command(plotter_instance, command):
     """
     Send a USB command to the plotter, handling API differences.
     
     Args:
         plotter_instance: The plotter instance (AxiDraw or NextDraw)
-        command: Command string (without trailing \\r for NextDraw)
+        command: Command string, or ASCII bytes (with or without trailing \\r)
     
     Note:
         AxiDraw requires \\r at the end of commands, NextDraw does not.
         This function handles the difference automatically.
     """
-    plotter_type = _current_plotter_type
-    
-    if plotter_type == PLOTTER_AXIDRAW:
-        # AxiDraw requires \r at the end
-        if not command.endswith('\r'):
-            command = command + '\r'
-        plotter_instance.usb_command(command)
-    else:
-        # NextDraw does not need \r (it's added automatically)
-        # Remove \r if present to avoid double-adding
-        if command.endswith('\r'):
-            command = command[:-1]
-        plotter_instance.usb_command(command)
+    _DISPATCH.send(plotter_instance, command)
 
 
 def usb_query(plotter_instance, query):
@@ -123,7 +220,7 @@ def usb_query(plotter_instance, query):
     
     Args:
         plotter_instance: The plotter instance (AxiDraw or NextDraw)
-        query: Query string (without trailing \\r for NextDraw)
+        query: Query string, or ASCII bytes (with or without trailing \\r)
     
     Returns:
         Query response string
@@ -132,42 +229,102 @@ def usb_query(plotter_instance, query):
         AxiDraw requires \\r at the end of queries, NextDraw does not.
         This function handles the difference automatically.
     """
-    plotter_type = _current_plotter_type
+    return _DISPATCH.query(plotter_instance, query)
+
+
+def usb_command_batch(plotter_instance, commands):
+    """
+    Send a sequence of USB commands to the plotter, handling API differences.
     
-    if plotter_type == PLOTTER_AXIDRAW:
-        # AxiDraw requires \r at the end
-        if not query.endswith('\r'):
-            query = query + '\r'
-        return plotter_instance.usb_query(query)
-    else:
-        # NextDraw does not need \r (it's added automatically)
-        # Remove \r if present to avoid double-adding
-        if query.endswith('\r'):
-            query = query[:-1]
-        return plotter_instance.usb_query(query)
+    Args:
+        plotter_instance: The plotter instance (AxiDraw or NextDraw)
+        commands: Iterable of command strings (or bytes), as for usb_command()
+    
+    Note:
+        Same result as calling usb_command() for each command, but the plotter
+        type and the instance's usb_command method are looked up once for the
+        whole sequence. Commands are written one by one as the iterable yields
+        them (each is still its own serial write).
+    """
+    send = plotter_instance.usb_command
+    normalize = _DISPATCH.normalize
+    for command in commands:
+        send(normalize(command))
+
+
+def set_low_latency(plotter_instance):
+    """
+    Put the plotter's serial port into low-latency mode, if the platform allows it.
+    
+    Args:
+        plotter_instance: A connected plotter instance (AxiDraw or NextDraw)
+    
+    Returns:
+        True if low-latency mode was enabled, False otherwise
+    
+    Note:
+        Uses pyserial's set_low_latency_mode() (Linux only). It sets
+        ASYNC_LOW_LATENCY on the tty so the driver hands each reply on at once
+        instead of waiting out its latency timer. Drivers that don't support
+        the flag, and other platforms, are left as they are.
+        The pyserial object is plot_status.port on current pyaxidraw and
+        NextDraw; serial_port is checked as a fallback for older releases.
+    """
+    serial_port = getattr(getattr(plotter_instance, 'plot_status', None), 'port', None)
+    if serial_port is None:
+        serial_port = getattr(plotter_instance, 'serial_port', None)
+    if serial_port is None:
+        logger.debug("No serial port found on %s; low-latency mode not set",
+                     type(plotter_instance).__name__)
+        return False
+    set_mode = getattr(serial_port, 'set_low_latency_mode', None)
+    if set_mode is None:
+        return False
+    try:
+        set_mode(True)
+        return True
+    except (OSError, ValueError):
+        return False
+
+
+# Display names per plotter type (UI and /state)
+_DISPLAY_NAMES = {PLOTTER_AXIDRAW: "AxiDraw", PLOTTER_NEXTDRAW: "NextDraw"}
+_API_NAMES = {PLOTTER_AXIDRAW: "PyAxidraw", PLOTTER_NEXTDRAW: "NextDraw"}
 
 
 def get_plotter_display_name(plotter_type=None):
     """Get the display name for a plotter type."""
     if plotter_type is None:
-        plotter_type = _current_plotter_type
-    
-    if plotter_type == PLOTTER_AXIDRAW:
-        return "AxiDraw"
-    elif plotter_type == PLOTTER_NEXTDRAW:
-        return "NextDraw"
-    else:
-        return "Unknown"
+        plotter_type = _DISPATCH.type
+    return _DISPLAY_NAMES.get(plotter_type, "Unknown")
 
 
 def get_api_display_name(plotter_type=None):
     """Get the API/library display name for a plotter type."""
     if plotter_type is None:
-        plotter_type = _current_plotter_type
+        plotter_type = _DISPATCH.type
+    return _API_NAMES.get(plotter_type, "Unknown")
+
+
+def __getattr__(name):
+    """
+    Resolve plotter_adapter.AxiDraw and plotter_adapter.NextDraw on first access (PEP 562).
     
-    if plotter_type == PLOTTER_AXIDRAW:
-        return "PyAxidraw"
-    elif plotter_type == PLOTTER_NEXTDRAW:
-        return "NextDraw"
+    Importing this module loads neither plotter library; the class is imported
+    when first asked for and then stored as a module global, so later accesses
+    are plain attribute lookups.
+    """
+    if name == "AxiDraw":
+        plotter_type = PLOTTER_AXIDRAW
+    elif name == "NextDraw":
+        plotter_type = PLOTTER_NEXTDRAW
     else:
-        return "Unknown"
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    try:
+        cls = _plotter_class(plotter_type)
+    except ImportError as e:
+        # An uninstalled library is a missing attribute, so hasattr() and
+        # getattr(module, name, None) work as expected
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r} ({e})") from e
+    globals()[name] = cls
+    return cls
@@ -0,0 +1,67 @@
+"""Tests for _strip_svg_for_plot() (SVG clean-up before plotting)."""
+
+import unittest
+
+from lxml import etree
+
+from app import _strip_svg_for_plot
+
+
+# Text as cairo writes it (matplotlib, pycairo, Inkscape PDF import): the glyphs
+# are <symbol>s inside an id-less <g> in <defs>, drawn with <use>
+CAIRO_TEXT_SVG = """<?xml version="1.0" encoding="UTF-8"?>
+<svg xmlns="http://www.w3.org/2000/svg" xmlns:xlink="http://www.w3.org/1999/xlink" width="100pt" height="50pt" viewBox="0 0 100 50" version="1.1">
+<defs>
+<g>
+<symbol overflow="visible" id="glyph0-1">
+<path style="stroke:none;" d="M 1 0 L 1 -7 L 5 -7 L 5 0 Z "/>
+</symbol>
+</g>
+</defs>
+<g id="surface1">
+<g style="fill:rgb(0%,0%,0%);fill-opacity:1;">
+  <use xlink:href="#glyph0-1" x="10" y="20"/>
+</g>
+</g>
+</svg>
+"""
+
+# Illustrator export: a Generator comment and entities defined in the DOCTYPE
+ILLUSTRATOR_SVG = """<?xml version="1.0" encoding="utf-8"?>
+<!-- Generator: Adobe Illustrator 16.0.0, SVG Export Plug-In  -->
+<!DOCTYPE svg PUBLIC "-//W3C//DTD SVG 1.1//EN" "http://www.w3.org/Graphics/SVG/1.1/DTD/svg11.dtd" [
+	<!ENTITY st0 "fill:none;stroke:#000000;">
+]>
+<svg xmlns="http://www.w3.org/2000/svg" width="100" height="100">
+<!-- layer comment -->
+<path style="&st0;" d="M 0 0 L 10 10"/>
+</svg>
+"""
+
+
+class StripSvgForPlotTest(unittest.TestCase):
+
+    def test_keeps_referenced_symbol_nested_in_defs(self):
+        out = _strip_svg_for_plot(CAIRO_TEXT_SVG)
+        root = etree.fromstring(out.encode())
+        ids = {el.get('id') for el in root.iter() if isinstance(el.tag, str)}
+        self.assertIn('glyph0-1', ids)
+
+    def test_drops_unreferenced_defs_children(self):
+        svg = ('<svg xmlns="http://www.w3.org/2000/svg"><defs>'
+               '<g><linearGradient id="unused"/></g></defs>'
+               '<path d="M0 0L1 1"/></svg>')
+        out = _strip_svg_for_plot(svg)
+        self.assertNotIn('unused', out)
+        self.assertIn('<path', out)
+
+    def test_keeps_doctype_entities(self):
+        out = _strip_svg_for_plot(ILLUSTRATOR_SVG)
+        self.assertNotIn('layer comment', out)
+        root = etree.fromstring(out.encode())
+        path = root.find('{http://www.w3.org/2000/svg}path')
+        self.assertEqual(path.get('style'), 'fill:none;stroke:#000000;')
+
+
+if __name__ == '__main__':
+    unittest.main()